@@ -1,80 +1,254 @@
 import os
 import asyncio
+import contextlib
+import functools
+import hashlib
 import time
 import argparse
 from pathlib import Path
-import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import httpx
+import orjson
 from aiohttp import web
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
-from agents import Agent, Runner
+from agents import Agent, ModelSettings, Runner
 from agents.mcp import MCPServerStreamableHttp
 
+try:
+    from dotenv import dotenv_values
+except ImportError:  # python-dotenv is optional
+    dotenv_values = None
 
-# Global storage for conversation sessions
-sessions: Dict[str, List[Dict[str, str]]] = {}
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and unavailable on Windows
+    uvloop = None
 
-# Global agent instance
-agent_instance = None
-
-# Global server metadata
-server_start_time = None
-mcp_url = None
 
 # Configuration constants
 MCP_CLIENT_SESSION_TIMEOUT = 900  # seconds
 MCP_HTTP_TIMEOUT = 900  # seconds
 MCP_SSE_READ_TIMEOUT = 60 * 60  # seconds (1 hour)
 RUN_TIMEOUT_SECONDS = 1800  # seconds
+RUN_TIMEOUT_MAX_SECONDS = 3600  # seconds
+WARMUP_TIMEOUT_SECONDS = 60  # seconds
+MCP_HTTP_LIMITS = httpx.Limits(
+    max_connections=64,
+    max_keepalive_connections=64,
+    keepalive_expiry=300,  # seconds
+)
+MAX_SESSIONS = 1024
+MAX_TURNS_PER_SESSION = 20
+HISTORY_MAX_CHARS = 16000
+HISTORY_MAX_TURN_CHARS = 8000
+SUMMARY_BATCH_TURNS = 10
+SUMMARY_TIMEOUT_SECONDS = 120  # seconds
+SUMMARY_MAX_PENDING_CHARS = 2 * HISTORY_MAX_CHARS
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation you are given so it can stand in for it as context "
+    "in later turns. Keep facts, decisions, names, file paths and open tasks. "
+    "Reply with the summary only."
+)
+
+
+@dataclass
+class Session:
+    """Conversation state of a single session
+
+    Turns are stored as parallel lists of roles and contents; evicted turns
+    awaiting summarization are kept as "role: content" transcript lines.
+    """
+    roles: List[str] = field(default_factory=list)
+    contents: List[str] = field(default_factory=list)
+    summary: str = ""
+    evicted: List[str] = field(default_factory=list)
+    summarizing: Optional[asyncio.Task] = None
+
+    def append(self, role: str, content: str) -> None:
+        self.roles.append(role)
+        self.contents.append(content)
+
+    def pop(self) -> None:
+        del self.roles[-1]
+        del self.contents[-1]
+
+
+class LRUSessions:
+    """Sessions keyed by session ID, evicting the least recently used"""
+
+    def __init__(
+        self,
+        max_sessions: int,
+        max_turns_per_session: int,
+    ):
+        self.max_sessions = max_sessions
+        self.max_turns_per_session = max_turns_per_session
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __getitem__(self, session_id: str) -> Session:
+        session = self._sessions[session_id]
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Session) -> None:
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def keys(self):
+        return self._sessions.keys()
+
+
+class SessionLocks:
+    """Per-session locks, dropped once no request holds or waits on them"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, session_id: str):
+        """Hold the lock guarding a session's conversation history"""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        # Count waiters as well as the holder: lock.locked() is briefly False
+        # between a release and the next waiter waking up
+        self._users[session_id] = self._users.get(session_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[session_id] -= 1
+            if not self._users[session_id]:
+                del self._users[session_id]
+                del self._locks[session_id]
+
+
+@dataclass
+class AppState:
+    """Server state shared by the request handlers of one application
+
+    Sessions live in this worker's memory. Running several workers requires
+    replacing LRUSessions with a store shared between them (e.g. Redis).
+    """
+    agent: Agent
+    mcp_server: MCPServerStreamableHttp
+    sessions: LRUSessions
+    locks: SessionLocks
+    mcp_url: str
+    prompt_file: Path
+    prompt_mtime_ns: int
+    start_time: float = field(default_factory=time.time)
+    reload_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    inflight: Dict[Tuple[str, str], asyncio.Future] = field(default_factory=dict)
+    background_tasks: Set[asyncio.Task] = field(default_factory=set)
+
+
+APP_STATE = web.AppKey("state", AppState)
+
+# Tool-less agent used to fold evicted turns into a session's running summary
+summarizer_agent = Agent(name="Summarizer", instructions=SUMMARY_INSTRUCTIONS)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_env_file(path: str, mtime_ns: int) -> Dict[str, str]:
+    """Parse a .env file into a dict (cached per path and modification time)"""
+    if dotenv_values is not None:
+        return {k: v for k, v in dotenv_values(path).items() if v is not None}
+
+    # Fallback parser when python-dotenv is not installed
+    values = {}
+    for line in Path(path).read_text().splitlines():
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not key or key.startswith("#"):
+            continue
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+            value = value[1:-1]
+        values[key] = value
+    return values
+
+
+def load_env_file(env_file: str) -> None:
+    """Load variables from the env file without overriding the environment"""
+    env_path = Path(env_file)
+    if not env_path.exists():
+        return
+
+    # mtime is part of the cache key so edits to the file are picked up
+    values = _read_env_file(str(env_path), env_path.stat().st_mtime_ns)
+    os.environ.update({k: v for k, v in values.items() if k not in os.environ})
+
+
+@functools.lru_cache(maxsize=4)
+def _read_prompt_file(path: str, mtime_ns: int) -> str:
+    """Read a system prompt file (cached per path and modification time)"""
+    return Path(path).read_text().strip()
+
+
+def ojson_response(payload: dict, status: int = 200) -> web.Response:
+    """Return a JSON response serialized with orjson"""
+    return web.Response(body=orjson.dumps(payload), content_type="application/json", status=status)
 
 
 async def health_handler(request: web.Request) -> web.Response:
     """Handle health check endpoint"""
-    global agent_instance
+    state = request.app[APP_STATE]
 
     health_status = {
-        "status": "healthy" if agent_instance is not None else "unhealthy",
+        "status": "healthy" if state.agent is not None else "unhealthy",
         "timestamp": time.time(),
-        "uptime": time.time() - server_start_time if 'server_start_time' in globals() else 0,
+        "uptime": time.time() - state.start_time,
         "agent": {
-            "initialized": agent_instance is not None,
-            "name": agent_instance.name if agent_instance else None
+            "initialized": state.agent is not None,
+            "name": state.agent.name if state.agent else None
         },
         "sessions": {
-            "active": len(sessions),
-            "session_ids": list(sessions.keys())
+            "active": len(state.sessions),
+            "session_ids": list(state.sessions.keys())
         },
         "configuration": {
-            "mcp_url": mcp_url if 'mcp_url' in globals() else None,
+            "mcp_url": state.mcp_url,
             "timeouts": {
                 "mcp_client_session": MCP_CLIENT_SESSION_TIMEOUT,
                 "mcp_http": MCP_HTTP_TIMEOUT,
                 "mcp_sse_read": MCP_SSE_READ_TIMEOUT,
-                "run_timeout": RUN_TIMEOUT_SECONDS
+                "run_timeout": RUN_TIMEOUT_SECONDS,
+                "run_timeout_max": RUN_TIMEOUT_MAX_SECONDS
             }
         }
     }
 
     status_code = 200 if health_status["status"] == "healthy" else 503
-    return web.json_response(health_status, status=status_code)
+    return ojson_response(health_status, status=status_code)
 
 
 async def shutdown_handler(request: web.Request) -> web.Response:
     """Handle shutdown endpoint - gracefully exits the Python process"""
     print("Shutdown requested via /shutdown endpoint")
+    state = request.app[APP_STATE]
 
     # Prepare shutdown response
     shutdown_info = {
         "status": "shutting_down",
         "message": "Server is shutting down",
         "timestamp": time.time(),
-        "uptime": time.time() - server_start_time if 'server_start_time' in globals() else 0
+        "uptime": time.time() - state.start_time
     }
 
     # Schedule shutdown after returning response
     asyncio.create_task(perform_shutdown())
 
-    return web.json_response(shutdown_info, status=200)
+    return ojson_response(shutdown_info, status=200)
 
 
 async def perform_shutdown():
@@ -84,23 +258,50 @@ async def perform_shutdown():
     os._exit(0)  # Exit the process
 
 
+async def reload_handler(request: web.Request) -> web.Response:
+    """Handle prompt reload endpoint - rebuilds the agent if the prompt file changed"""
+    state = request.app[APP_STATE]
+
+    async with state.reload_lock:
+        try:
+            mtime_ns = state.prompt_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return ojson_response(
+                {"error": f"Prompt file '{state.prompt_file}' not found"},
+                status=500
+            )
+
+        reloaded = mtime_ns != state.prompt_mtime_ns
+        if reloaded:
+            system_prompt = _read_prompt_file(str(state.prompt_file), mtime_ns)
+            state.agent = build_agent(system_prompt, state.mcp_server)
+            state.prompt_mtime_ns = mtime_ns
+            print(f"Reloaded system prompt from: {state.prompt_file}")
+
+    return ojson_response({
+        "status": "reloaded" if reloaded else "unchanged",
+        "prompt_file": str(state.prompt_file),
+        "timestamp": time.time()
+    })
+
+
 async def chat_handler(request: web.Request) -> web.Response:
     """Handle chat API endpoint"""
-    global agent_instance
+    state = request.app[APP_STATE]
 
-    if agent_instance is None:
-        return web.json_response(
+    if state.agent is None:
+        return ojson_response(
             {"error": "Agent not initialized"},
             status=503
         )
 
     try:
         # Parse JSON request
-        data = await request.json()
+        data = orjson.loads(await request.read())
 
         # Validate request
         if "message" not in data:
-            return web.json_response(
+            return ojson_response(
                 {"error": "Missing 'message' field in request body"},
                 status=400
             )
@@ -108,61 +309,301 @@ async def chat_handler(request: web.Request) -> web.Response:
         # Get session ID (optional)
         session_id = data.get("session_id", "default")
 
-        # Get or create conversation history for this session
-        if session_id not in sessions:
-            sessions[session_id] = []
-
-        conversation_history = sessions[session_id]
+        # Get run timeout (optional)
+        timeout = data.get("timeout_s", RUN_TIMEOUT_SECONDS)
+        if (
+            isinstance(timeout, bool)
+            or not isinstance(timeout, (int, float))
+            or not 0 < timeout <= RUN_TIMEOUT_MAX_SECONDS
+        ):
+            return ojson_response(
+                {"error": f"'timeout_s' must be a positive number of seconds up to {RUN_TIMEOUT_MAX_SECONDS}"},
+                status=400
+            )
 
-        # Add user message to history
         user_message = data["message"]
-        conversation_history.append({"role": "user", "content": user_message})
+        stream = data.get("stream", False)
+
+        # Collapse duplicate submissions of a message (retries, double clicks) into
+        # one agent run. Streamed replies can't be shared, so those always run.
+        # SHA-1 only serves as a compact dedupe key here
+        key = None
+        if not stream:
+            digest = hashlib.sha1(orjson.dumps(user_message), usedforsecurity=False).hexdigest()
+            key = (session_id, digest)
+            pending = state.inflight.get(key)
+            if pending is not None:
+                payload, status = await asyncio.shield(pending)
+                return ojson_response(payload, status=status)
+            state.inflight[key] = asyncio.get_running_loop().create_future()
 
-        # Run the agent
-        start = time.time()
         try:
-            out = await asyncio.wait_for(
-                Runner.run(agent_instance, conversation_history, max_turns=100),
-                timeout=RUN_TIMEOUT_SECONDS,
-            )
-            elapsed = time.time() - start
-
-            # Add assistant response to history
-            conversation_history.append({"role": "assistant", "content": out.final_output})
-
-            # Return success response
-            return web.json_response({
-                "response": out.final_output,
-                "session_id": session_id,
-                "elapsed_time": elapsed
-            })
-
-        except asyncio.TimeoutError:
-            return web.json_response(
-                {"error": f"Request timed out after {RUN_TIMEOUT_SECONDS} seconds"},
-                status=408
-            )
-        except Exception as exc:
-            return web.json_response(
-                {"error": f"Agent error: {str(exc)}"},
-                status=500
-            )
-
-    except json.JSONDecodeError:
-        return web.json_response(
+            # Serialize turns within a session so concurrent requests don't interleave
+            async with state.locks.hold(session_id):
+                # Get or create conversation state for this session
+                if session_id not in state.sessions:
+                    state.sessions[session_id] = Session()
+
+                session = state.sessions[session_id]
+
+                # Let a pending summary of evicted turns finish before building the input
+                if session.summarizing is not None:
+                    await asyncio.shield(session.summarizing)
+
+                # Add user message to history
+                session.append("user", user_message)
+
+                try:
+                    # Stream the reply as Server-Sent Events if requested
+                    if stream:
+                        return await stream_chat(request, session_id, session, timeout)
+
+                    payload, status = await run_chat(state, session_id, session, timeout)
+                finally:
+                    # Drop the user turn if it got no reply (timeout, error, disconnect)
+                    # so it doesn't poison the session's next request
+                    if session.roles and session.roles[-1] == "user":
+                        session.pop()
+
+            state.inflight[key].set_result((payload, status))
+            return ojson_response(payload, status=status)
+        finally:
+            if key is not None:
+                pending = state.inflight.pop(key)
+                if not pending.done():
+                    pending.set_result(({"error": "Request did not complete"}, 500))
+
+    except orjson.JSONDecodeError:
+        return ojson_response(
             {"error": "Invalid JSON in request body"},
             status=400
         )
     except Exception as e:
-        return web.json_response(
+        return ojson_response(
             {"error": f"Internal server error: {str(e)}"},
             status=500
         )
 
 
-async def init_agent(mcp_url: str, system_prompt: str) -> Agent:
-    """Initialize the agent with MCP server connection"""
-    print(f"Connecting to MCP server at: {mcp_url}")
+def clip(text: str, limit: int = HISTORY_MAX_TURN_CHARS) -> str:
+    """Truncate text to limit characters, noting how much was cut"""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}\n[... {len(text) - limit} characters truncated]"
+
+
+def compact_history(session: Session) -> List[Dict[str, str]]:
+    """Build the model input: the running summary followed by every stored turn
+
+    record_reply keeps the stored turns within the turn and character budgets,
+    so nothing is dropped here. Earlier turns are clipped to
+    HISTORY_MAX_TURN_CHARS; the latest turn (the message being answered) is
+    sent in full.
+    """
+    roles, contents = session.roles, session.contents
+    last = len(contents) - 1
+
+    # Build the input in one list, without intermediate slices
+    messages = []
+    if session.summary:
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{session.summary}"
+        })
+    messages.extend(
+        {"role": roles[i], "content": contents[i] if i == last else clip(contents[i])}
+        for i in range(len(contents))
+    )
+    return messages
+
+
+async def summarize_evicted(session: Session) -> None:
+    """Fold the session's evicted turns into its running summary"""
+    # Bound the transcript; after failed attempts this drops the oldest pending turns
+    total = sum(len(line) for line in session.evicted)
+    while total > SUMMARY_MAX_PENDING_CHARS:
+        total -= len(session.evicted.pop(0))
+
+    transcript = "\n".join(session.evicted)
+    if session.summary:
+        transcript = f"Summary so far:\n{session.summary}\n\nNew turns:\n{transcript}"
+
+    try:
+        out = await asyncio.wait_for(
+            Runner.run(summarizer_agent, transcript, max_turns=1),
+            timeout=SUMMARY_TIMEOUT_SECONDS,
+        )
+    except Exception as exc:
+        # Keep the evicted turns and retry with the next eviction
+        print(f"Failed to summarize conversation: {exc}")
+        return
+
+    session.summary = out.final_output
+    session.evicted.clear()
+
+
+def record_reply(state: AppState, session: Session, reply: str) -> None:
+    """Add the assistant reply to the session and fold the oldest turns into the summary
+
+    Afterwards the stored turns leave room for the next message within both
+    budgets: fewer than max_turns_per_session turns, and at most
+    HISTORY_MAX_CHARS minus one clipped turn of (clipped) content.
+    """
+    session.append("assistant", reply)
+
+    max_turns = state.sessions.max_turns_per_session
+
+    contents = session.contents
+    max_stored_chars = HISTORY_MAX_CHARS - HISTORY_MAX_TURN_CHARS
+    total = sum(min(len(content), HISTORY_MAX_TURN_CHARS) for content in contents)
+    overflow = 0
+    while overflow < len(contents) and (
+        len(contents) - overflow >= max_turns or total > max_stored_chars
+    ):
+        total -= min(len(contents[overflow]), HISTORY_MAX_TURN_CHARS)
+        overflow += 1
+    if not overflow:
+        return
+
+    # Evict in batches so the summarizer runs every few turns, not every turn
+    overflow = max(overflow, min(SUMMARY_BATCH_TURNS, len(contents) - 1))
+    session.evicted.extend(
+        f"{role}: {clip(content)}"
+        for role, content in zip(session.roles[:overflow], contents[:overflow])
+    )
+    del session.roles[:overflow]
+    del session.contents[:overflow]
+
+    if not session.evicted:
+        return
+
+    # Summarize without delaying this response; the session's next request
+    # waits for the task before building its input
+    task = asyncio.create_task(summarize_evicted(session))
+    session.summarizing = task
+    state.background_tasks.add(task)
+    task.add_done_callback(state.background_tasks.discard)
+
+
+async def run_chat(
+    state: AppState,
+    session_id: str,
+    session: Session,
+    timeout: float,
+) -> Tuple[dict, int]:
+    """Run the agent and return the JSON response payload and status for its reply"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        history = compact_history(session)
+        out = await asyncio.wait_for(
+            Runner.run(state.agent, history, max_turns=100),
+            timeout=timeout,
+        )
+        elapsed = loop.time() - start
+
+        record_reply(state, session, out.final_output)
+
+        # Return success response
+        return {
+            "response": out.final_output,
+            "session_id": session_id,
+            "elapsed_time": elapsed
+        }, 200
+
+    except asyncio.TimeoutError:
+        return {"error": f"Request timed out after {timeout} seconds"}, 408
+    except Exception as exc:
+        return {"error": f"Agent error: {str(exc)}"}, 500
+
+
+async def stream_chat(
+    request: web.Request,
+    session_id: str,
+    session: Session,
+    timeout: float,
+) -> web.StreamResponse:
+    """Run the agent and stream its output text to the client as Server-Sent Events"""
+    state = request.app[APP_STATE]
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+
+    async def send_event(payload: dict) -> None:
+        await response.write(b"data: " + orjson.dumps(payload) + b"\n\n")
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    history = compact_history(session)
+    result = Runner.run_streamed(state.agent, history, max_turns=100)
+
+    async def forward_deltas() -> None:
+        async for event in result.stream_events():
+            if (
+                event.type == "raw_response_event"
+                and event.data.type == "response.output_text.delta"
+            ):
+                await send_event({"delta": event.data.delta})
+
+    try:
+        await asyncio.wait_for(forward_deltas(), timeout=timeout)
+        elapsed = loop.time() - start
+
+        await send_event({
+            "response": result.final_output,
+            "session_id": session_id,
+            "elapsed_time": elapsed
+        })
+
+        record_reply(state, session, result.final_output)
+
+    except asyncio.TimeoutError:
+        await send_event({"error": f"Request timed out after {timeout} seconds"})
+    except Exception as exc:
+        await send_event({"error": f"Agent error: {str(exc)}"})
+    finally:
+        # Stop the background run and its MCP calls if it didn't finish
+        if not result.is_complete:
+            result.cancel()
+
+    await response.write_eof()
+    return response
+
+
+def mcp_http_client_factory(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+    uds: Optional[str] = None,
+) -> httpx.AsyncClient:
+    """Create the keep-alive HTTP client shared by all requests to the MCP server
+
+    If uds is given, requests go over that UNIX domain socket instead of TCP.
+    """
+    if uds:
+        # An explicit transport carries the pool limits; the client ignores its own
+        pool = {"transport": httpx.AsyncHTTPTransport(uds=uds, limits=MCP_HTTP_LIMITS)}
+    else:
+        pool = {"limits": MCP_HTTP_LIMITS}
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout,
+        auth=auth,
+        follow_redirects=True,
+        **pool,
+    )
+
+
+async def connect_mcp_server(
+    mcp_url: str,
+    mcp_unix_socket: Optional[str] = None,
+) -> MCPServerStreamableHttp:
+    """Connect to the MCP server that provides the agent's tools"""
+    if mcp_unix_socket:
+        print(f"Connecting to MCP server at: {mcp_url} (via UNIX socket {mcp_unix_socket})")
+    else:
+        print(f"Connecting to MCP server at: {mcp_url}")
 
     mcp_server = MCPServerStreamableHttp(
         name="unity-mcp",
@@ -170,6 +611,9 @@ async def init_agent(mcp_url: str, system_prompt: str) -> Agent:
             "url": mcp_url,
             "timeout": MCP_HTTP_TIMEOUT,
             "sse_read_timeout": MCP_SSE_READ_TIMEOUT,
+            "httpx_client_factory": functools.partial(
+                mcp_http_client_factory, uds=mcp_unix_socket
+            ),
         },
         cache_tools_list=True,
         client_session_timeout_seconds=MCP_CLIENT_SESSION_TIMEOUT,
@@ -177,18 +621,40 @@ async def init_agent(mcp_url: str, system_prompt: str) -> Agent:
 
     await mcp_server.__aenter__()
 
-    agent = Agent(
+    # Fetch the tool list now so the first chat request doesn't pay for it
+    tools = await mcp_server.list_tools()
+    print(f"Loaded {len(tools)} tools from MCP server")
+
+    return mcp_server
+
+
+def build_agent(system_prompt: str, mcp_server: MCPServerStreamableHttp) -> Agent:
+    """Create the agent on top of a connected MCP server"""
+    return Agent(
         name="Tester",
         instructions=system_prompt,
         mcp_servers=[mcp_server],
     )
 
-    return agent
 
+async def warm_up_agent(agent: Agent) -> None:
+    """Run a throwaway request so the first chat doesn't pay the cold-start cost
 
-async def main():
-    global agent_instance, server_start_time, mcp_url
+    The request still lists the MCP tools and sends their schemas, but with
+    tool_choice="none" the model cannot call them, so no Unity tool runs.
+    """
+    print("Warming up agent...")
+    warmup_agent = agent.clone(model_settings=ModelSettings(tool_choice="none"))
+    try:
+        await asyncio.wait_for(
+            Runner.run(warmup_agent, [{"role": "user", "content": "ping"}], max_turns=1),
+            timeout=WARMUP_TIMEOUT_SECONDS,
+        )
+    except Exception as exc:
+        print(f"Agent warmup failed (continuing): {exc}")
 
+
+async def main():
     # Record server start time
     server_start_time = time.time()
 
@@ -211,10 +677,31 @@ async def main():
         type=str,
         help='Path to the system prompt file (overrides AGENT_PROMPT_FILE env var, default: prompt.txt)'
     )
+    parser.add_argument(
+        '--unix-socket',
+        type=str,
+        help='Serve the HTTP API on this UNIX domain socket instead of TCP (--port is ignored)'
+    )
+    parser.add_argument(
+        '--mcp-unix-socket',
+        type=str,
+        help='Reach the MCP server through this UNIX domain socket; --mcp-url still sets the request path'
+    )
+    parser.add_argument(
+        '--warmup',
+        action='store_true',
+        help='Send a warmup request (one LLM call, no tool calls) to the agent at startup'
+    )
     args = parser.parse_args()
 
-    # Store MCP URL globally
-    mcp_url = args.mcp_url
+    # Load OpenAI API key
+    # Priority: 1) Environment variable, 2) Env file (OPENAI_AGENT_ENV, default: .env)
+    env_file = os.environ.get("OPENAI_AGENT_ENV", ".env")
+    load_env_file(env_file)
+    if "OPENAI_API_KEY" not in os.environ:
+        raise RuntimeError(
+            f"OPENAI_API_KEY not set. Export it or add it to the env file '{env_file}'."
+        )
 
     # Load prompt file
     # Priority: 1) CLI argument, 2) Environment variable, 3) Default "prompt.txt"
@@ -227,36 +714,66 @@ async def main():
         raise FileNotFoundError(
             f"Prompt file '{prompt_file}' not found. Use --prompt-file argument, set AGENT_PROMPT_FILE env var, or create prompt.txt."
         )
-    system_prompt = prompt_file.read_text().strip()
+    prompt_mtime_ns = prompt_file.stat().st_mtime_ns
+    system_prompt = _read_prompt_file(str(prompt_file), prompt_mtime_ns)
     print(f"Loading system prompt from: {prompt_file}")
 
     # Initialize agent
-    agent_instance = await init_agent(args.mcp_url, system_prompt)
+    mcp_server = await connect_mcp_server(args.mcp_url, args.mcp_unix_socket)
+    agent = build_agent(system_prompt, mcp_server)
+    if args.warmup:
+        await warm_up_agent(agent)
 
-    # Create web application
+    # Create web application and its shared state
     app = web.Application()
+    app[APP_STATE] = AppState(
+        agent=agent,
+        mcp_server=mcp_server,
+        sessions=LRUSessions(MAX_SESSIONS, MAX_TURNS_PER_SESSION),
+        locks=SessionLocks(),
+        mcp_url=args.mcp_url,
+        prompt_file=prompt_file,
+        prompt_mtime_ns=prompt_mtime_ns,
+        start_time=server_start_time,
+    )
     app.router.add_get('/health', health_handler)
     app.router.add_post('/shutdown', shutdown_handler)
     app.router.add_post('/chat', chat_handler)
+    app.router.add_post('/admin/reload', reload_handler)
 
     # Start server
-    print(f"Starting HTTP server on port {args.port}")
+    if args.unix_socket:
+        print(f"Starting HTTP server on UNIX socket {args.unix_socket}")
+        base_url = "http://localhost"
+        via = f" (via UNIX socket {args.unix_socket})"
+    else:
+        print(f"Starting HTTP server on port {args.port}")
+        base_url = f"http://localhost:{args.port}"
+        via = ""
     print(f"API endpoints:")
-    print(f"  - Health:   http://localhost:{args.port}/health")
-    print(f"  - Shutdown: http://localhost:{args.port}/shutdown")
-    print(f"  - Chat:     http://localhost:{args.port}/chat")
-    runner = web.AppRunner(app)
+    print(f"  - Health:   {base_url}/health{via}")
+    print(f"  - Shutdown: {base_url}/shutdown{via}")
+    print(f"  - Chat:     {base_url}/chat{via}")
+    print(f"  - Reload:   {base_url}/admin/reload{via}")
+    runner = web.AppRunner(app, access_log=None, handle_signals=True)
     await runner.setup()
-    site = web.TCPSite(runner, 'localhost', args.port)
+    if args.unix_socket:
+        site = web.UnixSite(runner, args.unix_socket)
+    else:
+        site = web.TCPSite(runner, 'localhost', args.port)
     await site.start()
 
     print("\nServer is running. Press Ctrl+C to stop.")
     try:
         await asyncio.Event().wait()
-    except KeyboardInterrupt:
+    finally:
         print("\nShutting down server...")
         await runner.cleanup()
+        await mcp_server.__aexit__(None, None, None)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())